@@ -3,35 +3,129 @@
 Голосовой ассистент с wake word detection.
 Поддержка русского и английского языков с автоопределением.
 Wake words: "компьютер" (RU), "computer" (EN)
+
+Запуск: voice-assistant.py [--config config.json] [--language ru,en]
 """
 
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import os
 import subprocess
-import json
-import queue
 import logging
+import queue
 import sys
+import threading
 import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import ahocorasick
+import numpy as np
+import orjson
 import sounddevice as sd
+import webrtcvad
 from vosk import Model, KaldiRecognizer
 
 # Настройки
 SAMPLE_RATE = 16000
+BLOCKSIZE = 1600  # сэмплов в одном блоке (100 мс); при xrun на слабом железе - 3200
+RING_SIZE = BLOCKSIZE * 40  # ёмкость кольцевого буфера (4 сек), кратна блоку
 SILENCE_TIMEOUT = 2.0  # секунды тишины для окончания диктовки
+DEVICE = "pipewire"  # аудио устройство для захвата
+XDO_TYPE_DELAY = 12000  # мкс между символами, как у xdotool type
+XDO_CURRENTWINDOW = 0
+
+# VAD: пока в комнате тихо, блоки не отдаются распознавателям wake word
+VAD_AGGRESSIVENESS = 2  # 0-3, чем больше, тем строже отсев не-речи
+VAD_FRAME = SAMPLE_RATE * 20 // 1000  # кадр webrtcvad: 20 мс, блок делится нацело
+VAD_PREROLL = 0.5  # секунды тишины перед речью, чтобы не потерять начало слова
+VAD_HANGOVER = 1.0  # секунды тишины после речи, нужные Kaldi для конца фразы
+VAD_PREROLL_BLOCKS = -(-int(VAD_PREROLL * SAMPLE_RATE) // BLOCKSIZE)
+VAD_HANGOVER_BLOCKS = -(-int(VAD_HANGOVER * SAMPLE_RATE) // BLOCKSIZE)
+
+# Каталог с моделями Vosk; можно указать каталог с квантованными (int8) копиями
+MODELS_DIR = os.environ.get("VOSK_MODELS_DIR", "/home/jaennil/.local/share/vosk")
 
 # Языковые настройки
 LANGUAGES = {
     "ru": {
-        "model_path": "/home/jaennil/.local/share/vosk/vosk-model-small-ru-0.22",
+        "model_path": os.path.join(MODELS_DIR, "vosk-model-small-ru-0.22"),
         "wake_words": ["компьютер", "компютер"],
         "name": "Русский"
     },
     "en": {
-        "model_path": "/home/jaennil/.local/share/vosk/vosk-model-small-en-us-0.15",
+        "model_path": os.path.join(MODELS_DIR, "vosk-model-small-en-us-0.15"),
         "wake_words": ["computer"],
         "name": "English"
     }
 }
 
+
+def build_wake_automaton(words: tuple[str, ...]) -> ahocorasick.Automaton:
+    """Собирает автомат Ахо-Корасик для поиска wake words за один проход."""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+def apply_config(config: dict, languages: list[str] | None = None):
+    """Применяет настройки из JSON конфига и оставляет только выбранные языки.
+
+    Ключи конфига: "silence_timeout", "device" и "languages" - словарь
+    в формате LANGUAGES. Отсутствующие ключи берутся из значений по умолчанию.
+    """
+    global SILENCE_TIMEOUT, DEVICE, LANGUAGES, WAKE_WORDS, WAKE_AUTOMATA, WAKE_MIN_LEN
+
+    if not isinstance(config, dict):
+        raise ValueError("Конфиг должен быть JSON объектом")
+    all_languages = config.get("languages", LANGUAGES)
+    if not isinstance(all_languages, dict):
+        raise ValueError('"languages" должен быть объектом')
+    if languages:
+        unknown = [lang for lang in languages if lang not in all_languages]
+        if unknown:
+            raise ValueError(f"Неизвестные языки: {', '.join(unknown)}")
+        all_languages = {lang: all_languages[lang] for lang in languages}
+    if not all_languages:
+        raise ValueError("Не задано ни одного языка")
+    for lang, cfg in all_languages.items():
+        if not isinstance(cfg, dict):
+            raise ValueError(f"Язык {lang}: настройки должны быть объектом")
+        missing = [key for key in ("model_path", "name", "wake_words") if key not in cfg]
+        if missing:
+            raise ValueError(f"Язык {lang}: нет ключей {', '.join(missing)}")
+        words = cfg["wake_words"]
+        if not isinstance(words, list) or not words or \
+                not all(isinstance(word, str) and word for word in words):
+            raise ValueError(f"Язык {lang}: wake_words должен быть непустым списком строк")
+
+    silence_timeout = config.get("silence_timeout", SILENCE_TIMEOUT)
+    if isinstance(silence_timeout, bool) or not isinstance(silence_timeout, (int, float)) \
+            or silence_timeout <= 0:
+        raise ValueError('"silence_timeout" должен быть положительным числом секунд')
+    device = config.get("device", DEVICE)
+    # sounddevice принимает имя устройства, его номер или None (по умолчанию)
+    if isinstance(device, bool) or not isinstance(device, (str, int, type(None))):
+        raise ValueError('"device" должен быть именем или номером устройства')
+
+    SILENCE_TIMEOUT = silence_timeout
+    DEVICE = device
+    LANGUAGES = all_languages
+    # Wake words в нижнем регистре, чтобы не обращаться к LANGUAGES на каждый блок
+    WAKE_WORDS = {lang: tuple(word.lower() for word in cfg["wake_words"])
+                  for lang, cfg in LANGUAGES.items()}
+    WAKE_AUTOMATA = {lang: build_wake_automaton(words) for lang, words in WAKE_WORDS.items()}
+    # Более короткий текст не может содержать ни одного wake word
+    WAKE_MIN_LEN = min(len(word) for words in WAKE_WORDS.values() for word in words)
+
+
+# Строим таблицы wake words для настроек по умолчанию
+apply_config({})
+
 # Логирование
 logging.basicConfig(
     level=logging.INFO,
@@ -40,157 +134,455 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
-# Очередь для аудио данных
-audio_queue = queue.Queue()
+# Кольцевой буфер для аудио данных: пишет только callback, читает только decode_loop
+audio_ring = np.zeros(RING_SIZE, dtype=np.int16)
+ring_write = array('Q', [0])  # сколько сэмплов записано всего
+ring_read = array('Q', [0])   # сколько сэмплов прочитано всего
+audio_ready = threading.Event()
+# Пока не установлен (модели грузятся), читателя нет и ring_read двигает callback
+decoder_started = threading.Event()
+# libxdo и открытое соединение с X сервером, см. open_xdo()
+xdo = None
+libc = ctypes.CDLL(None)
+libc.free.argtypes = [ctypes.c_void_p]
+
+# Проблемы захвата: callback только отмечает их, логирует decode_loop,
+# т.к. логирование внутри callback само может вызвать xrun
+audio_problems = {"status": None}
+# Счётчики отброшенных блоков: первый пишет только callback, второй - только
+# report_audio_problems, как и ring_write/ring_read
+dropped_blocks = array('Q', [0])
+dropped_reported = array('Q', [0])
+
+# Результаты потока декодирования: (язык, текст, финальный ли),
+# либо исключение, если поток декодирования упал
+wake_results = queue.SimpleQueue()
+dictation_results = queue.SimpleQueue()
+# Установлен, пока идёт диктовка: аудио идёт в dictation_target = (язык, распознаватель)
+dictation_active = threading.Event()
+dictation_target = None
+# main обработал финальный результат из wake_results
+wake_result_handled = threading.Event()
+# Текст для печати: печатает typing_loop, чтобы main сразу вернулся к wake word
+typing_queue = queue.SimpleQueue()
 
 
 def audio_callback(indata, frames, time_info, status):
     """Callback для захвата аудио."""
     if status:
+        audio_problems["status"] = status
+    samples = np.frombuffer(indata, dtype=np.int16)
+    n = len(samples)
+    write = ring_write[0]
+    if write - ring_read[0] + n > RING_SIZE:
+        if decoder_started.is_set():
+            dropped_blocks[0] += 1
+            return
+        # Во время загрузки вытесняем самое старое аудио, чтобы сохранить свежее
+        ring_read[0] = write + n - RING_SIZE
+    start = write % RING_SIZE
+    first = min(n, RING_SIZE - start)
+    audio_ring[start:start + first] = samples[:first]
+    audio_ring[:n - first] = samples[first:]
+    ring_write[0] = write + n
+    audio_ready.set()
+
+
+def read_frame(timeout: float) -> bytes | None:
+    """Читает блок из BLOCKSIZE сэмплов, ждёт не дольше timeout секунд."""
+    deadline = time.monotonic() + timeout
+    while ring_write[0] - ring_read[0] < BLOCKSIZE:
+        audio_ready.clear()
+        # callback мог записать данные между проверкой и clear()
+        if ring_write[0] - ring_read[0] >= BLOCKSIZE:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not audio_ready.wait(remaining):
+            return None
+
+    # Блоки не пересекают границу буфера, поэтому копия ровно одна -
+    # bytes, который потом уходит во все AcceptWaveform
+    read = ring_read[0]
+    start = read % RING_SIZE
+    data = audio_ring[start:start + BLOCKSIZE].tobytes()
+    ring_read[0] = read + BLOCKSIZE
+    return data
+
+
+def report_audio_problems():
+    """Логирует проблемы захвата, отмеченные в audio_callback."""
+    status = audio_problems["status"]
+    if status:
+        audio_problems["status"] = None
         log.warning(f"Audio status: {status}")
-    audio_queue.put(bytes(indata))
+    dropped = dropped_blocks[0]
+    if dropped != dropped_reported[0]:
+        log.warning(f"Аудио буфер переполнен, отброшено блоков: {dropped - dropped_reported[0]}")
+        dropped_reported[0] = dropped
+
+
+def open_xdo() -> tuple[ctypes.CDLL, int] | None:
+    """Загружает libxdo и подключается к X серверу; None, если это не удалось.
+
+    Одно соединение живёт всё время работы, поэтому печать не тратит время
+    на запуск xdotool и XOpenDisplay.
+    """
+    path = ctypes.util.find_library("xdo")
+    if not path:
+        return None
+    lib = ctypes.CDLL(path)
+    lib.xdo_new.restype = ctypes.c_void_p
+    lib.xdo_new.argtypes = [ctypes.c_char_p]
+    lib.xdo_enter_text_window.argtypes = [
+        ctypes.c_void_p, ctypes.c_ulong, ctypes.c_char_p, ctypes.c_uint]
+    lib.xdo_get_active_modifiers.argtypes = [
+        ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_int)]
+    for func in (lib.xdo_clear_active_modifiers, lib.xdo_set_active_modifiers):
+        func.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_void_p, ctypes.c_int]
+    handle = lib.xdo_new(None)
+    if not handle:
+        return None
+    return lib, handle
 
 
 def type_text(text: str):
-    """Печатает текст в активное окно через xdotool."""
+    """Печатает текст в активное окно через libxdo, без неё - через xdotool."""
     if not text.strip():
         return
     log.info(f"Печатаю: {text}")
+    if xdo is not None:
+        lib, handle = xdo
+        # То же, что xdotool type --clearmodifiers
+        mods = ctypes.c_void_p()
+        n_mods = ctypes.c_int()
+        lib.xdo_get_active_modifiers(handle, ctypes.byref(mods), ctypes.byref(n_mods))
+        lib.xdo_clear_active_modifiers(handle, XDO_CURRENTWINDOW, mods, n_mods)
+        if lib.xdo_enter_text_window(handle, XDO_CURRENTWINDOW, text.encode(), XDO_TYPE_DELAY):
+            log.error("Ошибка libxdo: не удалось напечатать текст")
+        lib.xdo_set_active_modifiers(handle, XDO_CURRENTWINDOW, mods, n_mods)
+        libc.free(mods)
+        return
     try:
         subprocess.run(
             ["xdotool", "type", "--clearmodifiers", "--", text],
             check=True,
             timeout=10
         )
-    except subprocess.SubprocessError as e:
+    except (subprocess.SubprocessError, OSError) as e:
         log.error(f"Ошибка xdotool: {e}")
 
 
+def typing_loop():
+    """Поток печати: по очереди печатает всё, что надиктовано."""
+    while True:
+        text = typing_queue.get()
+        try:
+            type_text(text)
+        except Exception:
+            # Поток должен пережить ошибку, иначе дальше ничего не напечатается
+            log.exception("Ошибка печати")
+
+
 def check_wake_word(text: str, lang: str) -> tuple[bool, str]:
     """Проверяет наличие wake word и возвращает (найден, остаток текста)."""
-    text_lower = text.lower()
-    for word in LANGUAGES[lang]["wake_words"]:
-        if word in text_lower:
-            idx = text_lower.find(word)
-            remainder = text[idx + len(word):].strip()
-            return True, remainder
+    if len(text) < WAKE_MIN_LEN:
+        return False, ""
+    # Vosk и так отдаёт нижний регистр - тогда обходимся без копии строки
+    text_lower = text if text.islower() else text.lower()
+    for end_idx, _ in WAKE_AUTOMATA[lang].iter(text_lower):
+        return True, text[end_idx + 1:].strip()
     return False, ""
 
 
-def listen_for_dictation(recognizer: KaldiRecognizer, lang: str) -> str:
-    """Слушает диктовку до 2 секунд тишины и возвращает весь текст."""
+def is_voiced(vad: webrtcvad.Vad, data: bytes) -> bool:
+    """Проверяет, есть ли речь хотя бы в одном кадре блока."""
+    step = VAD_FRAME * 2  # int16 - по 2 байта на сэмпл
+    # Кадры - срезы memoryview над тем же блоком, без копирования
+    view = memoryview(data)
+    return any(
+        vad.is_speech(view[i:i + step], SAMPLE_RATE)
+        for i in range(0, len(data) - step + 1, step)
+    )
+
+
+def report_wake_result(lang: str, text: str) -> bool:
+    """Отдаёт финальный результат в main и ждёт решения; True при переходе к диктовке."""
+    wake_result_handled.clear()
+    wake_results.put((lang, text, True))
+    # Ждём решения main, чтобы аудио после wake word ушло в диктовку
+    wake_result_handled.wait()
+    return dictation_active.is_set()
+
+
+def finish_wake_phrase(recognizers: dict[str, KaldiRecognizer]) -> bool:
+    """Забирает фразы, которые Kaldi не успел завершить, и сбрасывает распознаватели.
+
+    Возвращает True при переходе к диктовке.
+    """
+    for lang, rec in recognizers.items():
+        text = orjson.loads(rec.FinalResult()).get("text", "").strip()
+        rec.Reset()
+        if text and report_wake_result(lang, text):
+            # Остальные распознаватели main сбросит после диктовки
+            return True
+    return False
+
+
+def feed_wake_recognizers(
+    recognizers: dict[str, KaldiRecognizer], executor: ThreadPoolExecutor, data: bytes
+) -> bool:
+    """Отдаёт блок распознавателям wake word, возвращает True при переходе к диктовке."""
+    if len(recognizers) == 1:
+        # Один язык: параллелить нечего, не гоняем блок через executor
+        (lang, rec), = recognizers.items()
+        if not rec.AcceptWaveform(data):
+            return False
+        return report_wake_result(lang, orjson.loads(rec.Result()).get("text", "").strip())
+
+    futures = {
+        executor.submit(rec.AcceptWaveform, data): (lang, rec)
+        for lang, rec in recognizers.items()
+    }
+    for future in as_completed(futures):
+        if not future.result():
+            continue
+        lang, rec = futures[future]
+        text = orjson.loads(rec.Result()).get("text", "").strip()
+        if report_wake_result(lang, text):
+            # Остальные распознаватели main сбросит после диктовки; Kaldi не
+            # потокобезопасен, поэтому дожидаемся уже запущенных AcceptWaveform
+            for other in futures:
+                other.cancel()
+            wait(futures)
+            return True
+    return False
+
+
+def decode_loop(recognizers: dict[str, KaldiRecognizer], executor: ThreadPoolExecutor):
+    """Поток декодирования: кормит аудио распознавателям и отдаёт результаты в main.
+
+    Распознаватели разных языков независимы и отпускают GIL внутри Kaldi,
+    поэтому блок декодируется всеми языками параллельно в executor.
+    """
+    vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+    preroll = deque(maxlen=VAD_PREROLL_BLOCKS)
+    silent_blocks = VAD_HANGOVER_BLOCKS + 1
+
+    while True:
+        data = read_frame(timeout=1.0)
+        report_audio_problems()
+        if data is None:
+            continue
+
+        if dictation_active.is_set():
+            lang, rec = dictation_target
+            if rec.AcceptWaveform(data):
+                text = orjson.loads(rec.Result()).get("text", "").strip()
+                dictation_results.put((lang, text, True))
+            else:
+                # Текст частичного результата не нужен, только факт речи,
+                # поэтому JSON не разбираем
+                raw = rec.PartialResult()
+                if '"partial" : ""' not in raw and '"partial": ""' not in raw:
+                    dictation_results.put((lang, "", False))
+            continue
+
+        silent_blocks = 0 if is_voiced(vad, data) else silent_blocks + 1
+        if silent_blocks > VAD_HANGOVER_BLOCKS:
+            # Долгая тишина: Kaldi не нужен, начинаем следующую фразу с чистого листа
+            if silent_blocks == VAD_HANGOVER_BLOCKS + 1 and finish_wake_phrase(recognizers):
+                preroll.clear()
+                continue
+            preroll.append(data)
+            continue
+
+        # Один и тот же bytes уходит в VAD, историю и все распознаватели
+        blocks = [*preroll, data]
+        preroll.clear()
+        for block in blocks:
+            if feed_wake_recognizers(recognizers, executor, block):
+                break
+
+
+def run_decode_loop(recognizers: dict[str, KaldiRecognizer], executor: ThreadPoolExecutor):
+    """Запускает decode_loop; его ошибку передаёт в main, иначе ассистент молча оглохнет."""
+    try:
+        decode_loop(recognizers, executor)
+    except Exception as e:
+        wake_results.put(e)
+        dictation_results.put(e)
+
+
+def listen_for_dictation(lang: str) -> str:
+    """Слушает диктовку до SILENCE_TIMEOUT секунд тишины и возвращает весь текст."""
     lang_name = LANGUAGES[lang]["name"]
-    log.info(f"🎤 Слушаю диктовку [{lang_name}] (2 сек тишины для завершения)...")
+    log.info(f"🎤 Слушаю диктовку [{lang_name}] ({SILENCE_TIMEOUT:g} сек тишины для завершения)...")
     text_parts = []
-    last_speech_time = time.time()
+    # Момент, когда диктовка закончится, если речи больше не будет
+    deadline = time.monotonic() + SILENCE_TIMEOUT
 
     while True:
         try:
-            data = audio_queue.get(timeout=0.1)
+            result = dictation_results.get(timeout=0.1)
         except queue.Empty:
-            if time.time() - last_speech_time >= SILENCE_TIMEOUT:
-                log.info("⏹️ 2 секунды тишины - завершаю диктовку")
+            if time.monotonic() >= deadline:
+                log.info(f"⏹️ {SILENCE_TIMEOUT:g} сек тишины - завершаю диктовку")
                 break
             continue
+        if isinstance(result, Exception):
+            raise result
+        _, text, is_final = result
 
-        if recognizer.AcceptWaveform(data):
-            result = json.loads(recognizer.Result())
-            text = result.get("text", "").strip()
+        # Пустой финальный результат приходит только после паузы, так что
+        # тишину достаточно проверять по таймауту очереди выше
+        if is_final:
             if text:
                 log.info(f"Распознано [{lang_name}]: '{text}'")
                 text_parts.append(text)
-                last_speech_time = time.time()
+                deadline = time.monotonic() + SILENCE_TIMEOUT
         else:
-            partial = json.loads(recognizer.PartialResult())
-            if partial.get("partial", "").strip():
-                last_speech_time = time.time()
-
-        if time.time() - last_speech_time >= SILENCE_TIMEOUT:
-            log.info("⏹️ 2 секунды тишины - завершаю диктовку")
-            break
+            deadline = time.monotonic() + SILENCE_TIMEOUT
 
     return " ".join(text_parts)
 
 
+def load_model(item: tuple[str, dict]) -> tuple[str, Model]:
+    """Загружает модель одного языка; языки грузятся параллельно."""
+    lang, config = item
+    log.info(f"Загрузка модели: {config['name']}...")
+    try:
+        model = Model(config["model_path"])
+    except Exception as e:
+        raise RuntimeError(f"Не удалось загрузить модель {config['name']}: {e}") from e
+    log.info(f"  {config['name']} загружена, wake words: {', '.join(config['wake_words'])}")
+    return lang, model
+
+
+def wake_words_hint() -> str:
+    """Строка для лога: по одному wake word на каждый язык."""
+    return " или ".join(f"'{words[0]}' ({lang.upper()})" for lang, words in WAKE_WORDS.items())
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Голосовой ассистент с wake word detection")
+    parser.add_argument("--config", help="JSON файл с языками, wake words, моделями и устройством")
+    parser.add_argument("--language", help="языки через запятую, например ru,en (по умолчанию все)")
+    return parser.parse_args()
+
+
 def main():
-    # Загрузка моделей
-    models = {}
-    recognizers = {}
+    global dictation_target, xdo
 
-    for lang, config in LANGUAGES.items():
-        log.info(f"Загрузка модели: {config['name']}...")
-        try:
-            models[lang] = Model(config["model_path"])
-            recognizers[lang] = KaldiRecognizer(models[lang], SAMPLE_RATE)
-            recognizers[lang].SetWords(True)
-            log.info(f"  Wake words: {', '.join(config['wake_words'])}")
-        except Exception as e:
-            log.error(f"Не удалось загрузить модель {config['name']}: {e}")
-            sys.exit(1)
+    args = parse_args()
+    try:
+        config = {}
+        if args.config:
+            with open(args.config, "rb") as f:
+                config = orjson.loads(f.read())
+        apply_config(config, args.language.split(",") if args.language else None)
+    except (OSError, ValueError) as e:
+        log.error(f"Ошибка конфигурации: {e}")
+        sys.exit(1)
 
-    log.info("👂 Жду wake word: 'компьютер' (RU) или 'computer' (EN)")
+    xdo = open_xdo()
+    if xdo is None:
+        log.warning("libxdo недоступна, печатаю через xdotool")
+    threading.Thread(target=typing_loop, daemon=True).start()
 
-    device = "pipewire"
-    log.info(f"Используем аудио устройство: {device}")
+    log.info(f"Используем аудио устройство: {DEVICE}")
 
     try:
         with sd.RawInputStream(
             samplerate=SAMPLE_RATE,
-            blocksize=4000,
+            blocksize=BLOCKSIZE,
             dtype='int16',
             channels=1,
-            device=device,
+            device=DEVICE,
             callback=audio_callback
         ):
+            # Поток уже пишет в кольцевой буфер, пока модели грузятся: там
+            # остаются последние RING_SIZE сэмплов, и сказанное под конец
+            # загрузки будет распознано
+            models = {}
+            recognizers = {}
+            dict_recognizers = {}
+            try:
+                with ThreadPoolExecutor(max_workers=len(LANGUAGES)) as loader:
+                    for lang, model in loader.map(load_model, LANGUAGES.items()):
+                        models[lang] = model
+                        # SetWords не включаем: нужен только текст, а пословные тайминги
+                        # раздувают JSON, который приходится разбирать на каждый результат
+                        recognizers[lang] = KaldiRecognizer(model, SAMPLE_RATE)
+                        dict_recognizers[lang] = KaldiRecognizer(model, SAMPLE_RATE)
+            except RuntimeError as e:
+                log.error(e)
+                sys.exit(1)
+
+            # Модели живут до конца работы: убираем их из поля зрения сборщика мусора,
+            # чтобы его паузы не задерживали аудио поток
+            gc.freeze()
+
+            # Дальше ring_read двигает только поток декодирования
+            decoder_started.set()
+            executor = ThreadPoolExecutor(max_workers=len(recognizers))
+            threading.Thread(
+                target=run_decode_loop, args=(recognizers, executor), daemon=True
+            ).start()
+
+            log.info(f"👂 Жду wake word: {wake_words_hint()}")
+
             while True:
                 try:
-                    data = audio_queue.get(timeout=1.0)
+                    result = wake_results.get(timeout=1.0)
                 except queue.Empty:
                     continue
+                if isinstance(result, Exception):
+                    raise result
+                lang, text, _ = result
 
-                # Проверяем оба языка
-                detected_lang = None
-                remainder = ""
+                if text:
+                    log.info(f"Услышал [{LANGUAGES[lang]['name']}]: '{text}'")
 
-                for lang, rec in recognizers.items():
-                    if rec.AcceptWaveform(data):
-                        result = json.loads(rec.Result())
-                        text = result.get("text", "").strip()
+                found, remainder = check_wake_word(text, lang)
+                if not found:
+                    wake_result_handled.set()
+                    continue
 
-                        if text:
-                            log.info(f"Услышал [{LANGUAGES[lang]['name']}]: '{text}'")
+                lang_name = LANGUAGES[lang]["name"]
+                log.info(f"✨ Wake word обнаружен! Язык: {lang_name}")
 
-                        found, rem = check_wake_word(text, lang)
-                        if found:
-                            detected_lang = lang
-                            remainder = rem
-                            break
+                # Сбрасываем распознаватель диктовки после прошлого раза
+                dict_recognizer = dict_recognizers[lang]
+                dict_recognizer.Reset()
 
-                if detected_lang:
-                    lang_name = LANGUAGES[detected_lang]["name"]
-                    log.info(f"✨ Wake word обнаружен! Язык: {lang_name}")
+                # Выбрасываем то, что осталось от прошлой диктовки
+                while not dictation_results.empty():
+                    dictation_results.get_nowait()
 
-                    # Создаём свежий распознаватель для диктовки
-                    dict_recognizer = KaldiRecognizer(models[detected_lang], SAMPLE_RATE)
-                    dict_recognizer.SetWords(True)
+                # Переключаем поток декодирования на диктовку
+                dictation_target = (lang, dict_recognizer)
+                dictation_active.set()
+                wake_result_handled.set()
 
-                    all_text_parts = []
-                    if remainder:
-                        all_text_parts.append(remainder)
+                all_text_parts = []
+                if remainder:
+                    all_text_parts.append(remainder)
 
-                    dictation = listen_for_dictation(dict_recognizer, detected_lang)
-                    if dictation:
-                        all_text_parts.append(dictation)
+                dictation = listen_for_dictation(lang)
+                if dictation:
+                    all_text_parts.append(dictation)
 
-                    full_text = " ".join(all_text_parts)
-                    if full_text:
-                        type_text(full_text)
+                # Сбрасываем распознаватели, пока поток декодирования занят диктовкой,
+                # и возвращаем его к ожиданию wake word
+                for rec in recognizers.values():
+                    rec.Reset()
+                dictation_active.clear()
 
-                    # Сбрасываем распознаватели
-                    for rec in recognizers.values():
-                        rec.Reset()
+                full_text = " ".join(all_text_parts)
+                if full_text:
+                    typing_queue.put(full_text)
 
-                    log.info("👂 Жду wake word: 'компьютер' (RU) или 'computer' (EN)")
+                log.info(f"👂 Жду wake word: {wake_words_hint()}")
 
     except KeyboardInterrupt:
         log.info("Завершение работы...")